@@ -0,0 +1,4 @@
+import os
+
+# the banner pygame prints on import would corrupt the bot protocol stream
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
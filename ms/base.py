@@ -1,9 +1,13 @@
 import random
 from enum import Enum
+from functools import lru_cache
 from time import perf_counter
+from typing import AbstractSet
 from typing import Any
+from typing import Iterable
 from typing import Iterator
 from typing import Optional
+from typing import Protocol
 from typing import TypeVar
 
 import pygame
@@ -51,10 +55,229 @@ class Mode(Enum):
         return self.value[3]
 
 
+class BoardSpec(Protocol):
+    """board dimensions, either a `Mode` preset or a `CustomMode`"""
+
+    @property
+    def rows(self) -> int:
+        ...
+
+    @property
+    def cols(self) -> int:
+        ...
+
+    @property
+    def size(self) -> T_COORD:
+        ...
+
+    @property
+    def num_mines(self) -> int:
+        ...
+
+
+class CustomMode:
+    __slots__ = ("rows", "cols", "num_mines")
+
+    def __init__(self, rows: int, cols: int, num_mines: int):
+        assert rows > 0 and cols > 0, (rows, cols)
+        assert 0 <= num_mines < rows * cols, num_mines
+        self.rows = rows
+        self.cols = cols
+        self.num_mines = num_mines
+
+    @property
+    def size(self) -> T_COORD:
+        return self.rows, self.cols
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, CustomMode) and (
+            other.rows,
+            other.cols,
+            other.num_mines,
+        ) == (self.rows, self.cols, self.num_mines)
+
+    def __hash__(self) -> int:
+        return hash((self.rows, self.cols, self.num_mines))
+
+    def __repr__(self) -> str:
+        return f"CustomMode({self.rows}, {self.cols}, {self.num_mines})"
+
+
+@lru_cache(maxsize=8)
+def neighbor_table(rows: int, cols: int) -> tuple[tuple[int, ...], ...]:
+    """
+    flat neighbor indexes of every cell, indexed by `x * rows + y` as well
+
+    index objects are shared by all rows of the table, so it stays small
+    enough to keep a few board sizes around
+    """
+    indexes = list(range(rows * cols))
+    table = []
+    for x in range(cols):
+        for y in range(rows):
+            table.append(
+                tuple(
+                    indexes[nx * rows + ny]
+                    for nx, ny in (
+                        (x - 1, y),
+                        (x - 1, y - 1),
+                        (x, y - 1),
+                        (x + 1, y - 1),
+                        (x + 1, y),
+                        (x + 1, y + 1),
+                        (x, y + 1),
+                        (x - 1, y + 1),
+                    )
+                    if 0 <= nx < cols and 0 <= ny < rows
+                )
+            )
+    return tuple(table)
+
+
+class Layout:
+    """
+    mine positions and cell values of a board, detached from any grid
+
+    `regions` labels every cell with the 3BV click solving it: all zero
+    cells of an opening share one label, numbers off any opening get their
+    own, numbers bordering an opening and mines are -1
+    """
+
+    __slots__ = ("rows", "cols", "mines", "values", "regions", "bbbv")
+
+    def __init__(
+        self,
+        rows: int,
+        cols: int,
+        mines: list[T_COORD],
+        values: Optional[list[int]] = None,
+    ):
+        self.rows = rows
+        self.cols = cols
+        self.mines = mines
+
+        table = neighbor_table(rows, cols)
+        indexes = [x * rows + y for x, y in mines]
+        if values is None:
+            values = [0] * (rows * cols)
+            for index in indexes:
+                for neighbor in table[index]:
+                    values[neighbor] += 1
+        self.values = values  # indexed by `x * rows + y`
+
+        is_mine = bytearray(rows * cols)
+        for index in indexes:
+            is_mine[index] = 1
+        self.regions, self.bbbv = self.__label_regions(table, is_mine)
+
+    def __label_regions(
+        self, table: tuple[tuple[int, ...], ...], is_mine: bytearray
+    ) -> tuple[list[int], int]:
+        """single union-find pass over zero cells, linear in board size"""
+        values = self.values
+        parent = list(range(len(values)))
+
+        def find(index: int) -> int:
+            while parent[index] != index:
+                parent[index] = parent[parent[index]]
+                index = parent[index]
+            return index
+
+        for index, value in enumerate(values):
+            if value or is_mine[index]:
+                continue
+            for other in table[index]:
+                if other < index and not values[other] and not is_mine[other]:
+                    parent[find(other)] = find(index)
+
+        regions = [-1] * len(values)
+        num_regions = 0
+        for index, value in enumerate(values):
+            if is_mine[index]:
+                continue
+            if not value:
+                root = find(index)
+                if regions[root] < 0:
+                    regions[root] = num_regions
+                    num_regions += 1
+                regions[index] = regions[root]
+            elif all(values[i] or is_mine[i] for i in table[index]):
+                regions[index] = num_regions
+                num_regions += 1
+        return regions, num_regions
+
+    @classmethod
+    def generate(
+        cls,
+        rows: int,
+        cols: int,
+        num_mines: int,
+        avoid: Optional[T_COORD],
+        rng: Optional[random.Random] = None,
+    ) -> "Layout":
+        sample = random.sample if rng is None else rng.sample
+        if avoid is None:
+            indexes = sample(range(rows * cols), num_mines)
+            return cls(rows, cols, [divmod(i, rows) for i in indexes])
+
+        # sample flat indexes skipping over the avoided one
+        avoid_index = avoid[0] * rows + avoid[1]
+        mines = [
+            divmod(index + (index >= avoid_index), rows)
+            for index in sample(range(rows * cols - 1), num_mines)
+        ]
+        return cls(rows, cols, mines)
+
+    def clear_of(
+        self, pos: T_COORD, rng: Optional[random.Random] = None
+    ) -> "Layout":
+        """
+        the layout with a mine on `pos` moved to a random free cell, as
+        uniform as one generated avoiding `pos` in the first place
+        """
+        if pos not in self.mines:
+            return self
+
+        randrange = random.randrange if rng is None else rng.randrange
+        taken = set(self.mines)
+        while True:
+            target = divmod(randrange(self.rows * self.cols), self.rows)
+            if target not in taken:
+                break
+
+        # values only change around the two cells, regions are relabeled
+        table = neighbor_table(self.rows, self.cols)
+        values = self.values.copy()
+        for index in table[pos[0] * self.rows + pos[1]]:
+            values[index] -= 1
+        for index in table[target[0] * self.rows + target[1]]:
+            values[index] += 1
+        mines = [target if mine == pos else mine for mine in self.mines]
+        return Layout(self.rows, self.cols, mines, values)
+
+
+# bits of a packed cell state, the part of a cell that changes while playing
+OPENED = 1
+FLAGGED = 2
+EXPLODED = 4
+
+
 T_Co_Cell = TypeVar("T_Co_Cell", bound="Cell", covariant=True)
 
 
 class Cell:
+    __slots__ = (
+        "x",
+        "y",
+        "rect",
+        "value",
+        "is_pressed",
+        "has_exploded",
+        "is_opened",
+        "has_mine",
+        "is_flagged",
+    )
+
     def __init__(self, x: int, y: int, rect: Rect, value: int = 0):
         self.x = x
         self.y = y
@@ -66,6 +289,62 @@ class Cell:
         self.has_mine = False
         self.is_flagged = False
 
+    def mark_dirty(self) -> None:
+        """hook for cells which need to be redrawn on state transitions"""
+
+    def reset(self) -> None:
+        # value and mine are only visible once opened or flagged
+        looks_reset = not (
+            self.is_pressed
+            or self.has_exploded
+            or self.is_opened
+            or self.is_flagged
+        )
+        self.value = 0
+        self.is_pressed = False
+        self.has_exploded = False
+        self.is_opened = False
+        self.has_mine = False
+        self.is_flagged = False
+        if not looks_reset:
+            self.mark_dirty()
+
+    def open(self) -> None:
+        if not self.is_opened:
+            self.is_opened = True
+            self.mark_dirty()
+
+    def flag(self, flagged: bool = True) -> None:
+        if self.is_flagged != flagged:
+            self.is_flagged = flagged
+            self.mark_dirty()
+
+    def press(self, pressed: bool = True) -> None:
+        if self.is_pressed != pressed:
+            self.is_pressed = pressed
+            self.mark_dirty()
+
+    def explode(self) -> None:
+        if not self.has_exploded:
+            self.has_exploded = True
+            self.mark_dirty()
+
+    def restore(self, state: int) -> None:
+        """moves back to a state packed by `packed_state`"""
+        if state != self.packed_state:
+            self.is_opened = bool(state & OPENED)
+            self.is_flagged = bool(state & FLAGGED)
+            self.has_exploded = bool(state & EXPLODED)
+            self.mark_dirty()
+
+    @property
+    def packed_state(self) -> int:
+        return (
+            self.is_opened * OPENED
+            | self.is_flagged * FLAGGED
+            | self.has_exploded * EXPLODED
+        )
+
     @property
     def pos(self) -> T_COORD:
         return self.x, self.y
@@ -83,38 +362,31 @@ class Cell:
         return self
 
     def __hash__(self) -> int:
-        return hash((*self.pos, self.value))
+        return hash(self.pos)
 
     __radd__ = __add__
 
 
 class CellButton(Cell):
-    __tracked__ = [
-        "is_pressed",
-        "has_exploded",
-        "is_opened",
-        "has_mine",
-        "is_flagged",
-    ]
-
-    def __init__(self, x: int, y: int, rect: Rect, value: int = 0):
+    __slots__ = ("neighbors", "__dirty")
+
+    def __init__(
+        self,
+        x: int,
+        y: int,
+        rect: Rect,
+        dirty: set["CellButton"],
+        value: int = 0,
+    ):
         super().__init__(x, y, rect, value=value)
         self.neighbors: list["CellButton"] = []
-        self.dirty = True
+        self.__dirty = dirty
+        self.mark_dirty()
 
-    def __setattr__(self, key: Any, value: Any) -> None:
-        if (
-            hasattr(self, key)
-            and key in self.__tracked__
-            and value != self.__getattribute__(key)
-        ):
-            self.dirty = True
-        super().__setattr__(key, value)
+    def mark_dirty(self) -> None:
+        self.__dirty.add(self)
 
     def draw(self, is_game_over: bool) -> None:
-        if not self.dirty:
-            return
-
         screen = pygame.display.get_surface()
 
         if self.is_pressed:
@@ -150,17 +422,38 @@ class CellButton(Cell):
                         ),
                     )
 
-        self.dirty = False
-
 
 T_GAME_FIELD = list[list[CellButton]]
 
 
+class Snapshot:
+    """
+    immutable state of a grid, one packed `bytes` per board column
+
+    columns untouched between two snapshots are the very same objects, so a
+    long history costs memory in proportion to what changed
+    """
+
+    __slots__ = ("columns", "num_opened", "num_flagged", "exploded")
+
+    def __init__(
+        self,
+        columns: tuple[bytes, ...],
+        num_opened: int,
+        num_flagged: int,
+        exploded: bool,
+    ):
+        self.columns = columns
+        self.num_opened = num_opened
+        self.num_flagged = num_flagged
+        self.exploded = exploded
+
+
 class Grid:
     mines: list[T_COORD] = []
     board: T_GAME_FIELD = []
 
-    def __init__(self, rect: Rect, mode: Mode, scale: int):
+    def __init__(self, rect: Rect, mode: BoardSpec, scale: int):
         self.mode = mode
         self.__rows = self.mode.rows
         self.__cols = self.mode.cols
@@ -168,11 +461,21 @@ class Grid:
         self.rect = rect
         self.generated = False
         self.revealed = False
+        self.exploded = False
         self.__started_at: float = perf_counter()
         self.elapsed: float = 0.0
         self.num_mines: int = self.mode.num_mines
         self.num_opened = 0
         self.num_flagged = 0
+        # cells register here on state transitions, renderers drain it
+        self.dirty: set[CellButton] = set()
+        self.__frontier: set[CellButton] = set()
+        self.__frontier_unopened: set[CellButton] = set()
+        self.layout: Optional[Layout] = None
+        # opened cells per 3BV region, counted to allow closing them again
+        self.__solved_regions: dict[int, int] = {}
+        self.__snapshot: Optional[Snapshot] = None
+        self.__changed_columns: set[int] = set()
         self.reset_board()
 
     def __iter__(self) -> Iterator[CellButton]:
@@ -192,11 +495,8 @@ class Grid:
 
     @property
     def is_finished(self) -> bool:
-        for cell in self:
-            if cell.has_exploded:
-                return True
-        else:
-            return all([cell.has_mine for cell in self.unopened()])
+        # all mines stay unopened until revealed, so counters are enough
+        return self.exploded or self.left_unopened == self.num_mines
 
     def coordinates(self) -> Iterator[T_COORD]:
         """coordinates iterator"""
@@ -210,25 +510,83 @@ class Grid:
         yield from (cell for col in self.board for cell in col)
 
     def neighbor_coordinates(self, x: int, y: int) -> Iterator[T_COORD]:
-        is_left_edge = x - 1 < 0
-        is_top_edge = y - 1 < 0
-        is_right_edge = x + 1 >= self.__cols
-        is_bottom_edge = y + 1 >= self.__rows
+        yield from (neighbor.pos for neighbor in self.at(x, y).neighbors)
 
-        yield from (
-            neigh
-            for neigh in [
-                is_left_edge or (x - 1, y),
-                (is_top_edge or is_left_edge) or (x - 1, y - 1),
-                is_top_edge or (x, y - 1),
-                (is_top_edge or is_right_edge) or (x + 1, y - 1),
-                is_right_edge or (x + 1, y),
-                (is_bottom_edge or is_right_edge) or (x + 1, y + 1),
-                is_bottom_edge or (x, y + 1),
-                (is_bottom_edge or is_left_edge) or (x - 1, y + 1),
-            ]
-            if isinstance(neigh, tuple)
+    @property
+    def bbbv(self) -> int:
+        """3BV of the board, minimal number of clicks to clear it"""
+        return 0 if self.layout is None else self.layout.bbbv
+
+    @property
+    def bbbv_solved(self) -> int:
+        return len(self.__solved_regions)
+
+    @property
+    def has_changes(self) -> bool:
+        """whether any cell changed since the last snapshot (or restore)"""
+        return bool(self.__changed_columns)
+
+    def snapshot(self) -> Snapshot:
+        """
+        captures the current state, re-packing only columns changed since
+        the previous snapshot (or restore)
+        """
+        previous = self.__snapshot
+        changed: Iterable[int] = self.__changed_columns
+        if previous is None:
+            changed = range(self.__cols)
+            columns = [b""] * self.__cols
+        else:
+            columns = list(previous.columns)
+
+        for x in changed:
+            columns[x] = bytes(cell.packed_state for cell in self.board[x])
+
+        self.__snapshot = Snapshot(
+            tuple(columns), self.num_opened, self.num_flagged, self.exploded
         )
+        self.__changed_columns.clear()
+        return self.__snapshot
+
+    def restore(self, snapshot: Snapshot) -> None:
+        """brings back a snapshot taken since the board was generated"""
+        previous = self.__snapshot
+        assert previous is not None, "nothing was captured yet"
+
+        changed: set[CellButton] = set()
+        for x, column in enumerate(snapshot.columns):
+            if column is previous.columns[x] and (
+                x not in self.__changed_columns
+            ):
+                continue  # shared, nothing to do
+
+            for cell, state in zip(self.board[x], column):
+                if cell.packed_state == state:
+                    continue
+                was_opened = cell.is_opened
+                cell.restore(state)
+                if was_opened != cell.is_opened:
+                    self.__count_solved(cell, 1 if cell.is_opened else -1)
+                changed.add(cell)
+
+        self.__refresh_frontier_around(changed)
+
+        self.num_opened = snapshot.num_opened
+        self.num_flagged = snapshot.num_flagged
+        self.exploded = snapshot.exploded
+        self.revealed = False
+        self.__snapshot = snapshot
+        self.__changed_columns.clear()
+
+    @property
+    def frontier(self) -> AbstractSet[CellButton]:
+        """opened numbered cells next to at least one unopened cell"""
+        return self.__frontier
+
+    @property
+    def frontier_unopened(self) -> AbstractSet[CellButton]:
+        """unopened, unflagged cells next to at least one opened cell"""
+        return self.__frontier_unopened
 
     def unopened(self) -> Iterator[CellButton]:
         yield from (cell for cell in self if not cell.is_opened)
@@ -250,7 +608,7 @@ class Grid:
         return len(list(self.flagged_neighbors(x, y)))
 
     def __generate_cells(self) -> T_GAME_FIELD:
-        return [
+        board = [
             [
                 CellButton(
                     x,
@@ -261,15 +619,23 @@ class Grid:
                         self.__scale,
                         self.__scale,
                     ),
+                    self.dirty,
                 )
                 for y in range(self.__rows)
             ]
             for x in range(self.__cols)
         ]
 
-    def __sample_mine_positions(self, avoid: T_COORD) -> list[T_COORD]:
-        return random.sample(
-            [c for c in self.coordinates() if c != avoid], self.num_mines
+        # wired once per board, cells are reused by the following games
+        table = neighbor_table(self.__rows, self.__cols)
+        cells = [cell for col in board for cell in col]
+        for cell, neighbors in zip(cells, table):
+            cell.neighbors = [cells[index] for index in neighbors]
+        return board
+
+    def __has_board_of_size(self, rows: int, cols: int) -> bool:
+        return len(self.board) == cols and all(
+            len(col) == rows for col in self.board
         )
 
     def at(self, x: int, y: int) -> CellButton:
@@ -291,69 +657,172 @@ class Grid:
         else:
             return None
 
-    def reset_board(self, mode: Optional[Mode] = None) -> None:
+    def reset_board(self, mode: Optional[BoardSpec] = None) -> None:
         if mode is not None:
+            self.mode = mode
             self.__rows = mode.rows
             self.__cols = mode.cols
             self.num_mines = mode.num_mines
 
-        self.board.clear()
         self.generated = False
         self.revealed = False
+        self.exploded = False
         self.elapsed = 0.0
         self.num_opened = 0
         self.num_flagged = 0
-        self.board = self.__generate_cells()
+        self.__frontier.clear()
+        self.__frontier_unopened.clear()
+        self.layout = None
+        self.__solved_regions.clear()
+        self.__snapshot = None
+        self.__changed_columns.clear()
+
+        if self.__has_board_of_size(self.__rows, self.__cols):
+            for cell in self:
+                cell.reset()
+        else:
+            self.board = self.__generate_cells()
 
-    def on_open(self, cell: CellButton) -> None:
-        # FIXME: replace recursion with dfs traversal
-        if cell.is_flagged:
+    def __count_solved(self, cell: CellButton, delta: int) -> None:
+        if self.layout is None:
             return
 
-        if cell.has_mine:
-            cell.has_exploded = True
+        region = self.layout.regions[cell.x * self.__rows + cell.y]
+        if region < 0:
             return
 
+        count = self.__solved_regions.get(region, 0) + delta
+        if count:
+            self.__solved_regions[region] = count
+        else:
+            del self.__solved_regions[region]
+
+    def __refresh_frontier(self, cell: CellButton) -> None:
         if cell.is_opened:
-            if self.flags_around(*cell.pos) >= cell.value:
-                for neighbor in self.unopened_neighbors(*cell.pos):
-                    if not neighbor.is_flagged:
-                        self.on_open(neighbor)
+            self.__frontier_unopened.discard(cell)
+            if (
+                cell.value
+                and not cell.has_mine
+                and any(not n.is_opened for n in cell.neighbors)
+            ):
+                self.__frontier.add(cell)
+            else:
+                self.__frontier.discard(cell)
         else:
-            cell.is_opened = True
-            self.num_opened += 1
+            self.__frontier.discard(cell)
+            if not cell.is_flagged and any(
+                n.is_opened and not n.has_mine for n in cell.neighbors
+            ):
+                self.__frontier_unopened.add(cell)
+            else:
+                self.__frontier_unopened.discard(cell)
+
+    def __refresh_frontier_around(self, cells: Iterable[CellButton]) -> None:
+        """
+        only changed cells and their neighbors may change frontier status,
+        each of them is refreshed once however many changed cells it touches
+        """
+        affected: set[CellButton] = set()
+        for cell in cells:
+            if cell.is_opened and not cell.value and not cell.has_mine:
+                # never on the frontier, and of its opened neighbors only
+                # numbered ones can lose or gain the status
+                self.__frontier_unopened.discard(cell)
+                affected.update(
+                    n for n in cell.neighbors if n.value or not n.is_opened
+                )
+            else:
+                affected.add(cell)
+                affected.update(cell.neighbors)
 
-        for neigh in self.unopened_neighbors(*cell.pos):
-            if cell.value == 0:
-                self.on_open(neigh)
+        for cell in affected:
+            self.__refresh_frontier(cell)
 
-        cell.dirty = True
+    def __open_cell(self, cell: CellButton) -> None:
+        cell.open()
+        self.__changed_columns.add(cell.x)
+        self.__count_solved(cell, 1)
 
-    def generate_board(self, starts_at: T_COORD) -> None:
-        self.mines.clear()
-        self.mines = self.__sample_mine_positions(starts_at)
+    def toggle_flag(self, cell: CellButton) -> None:
+        if cell.is_opened:
+            return
 
-        for cell in self:
-            cell.neighbors = [
-                self.at(*pos) for pos in self.neighbor_coordinates(*cell.pos)
-            ]
+        cell.flag(not cell.is_flagged)
+        self.__changed_columns.add(cell.x)
+        self.num_flagged += int(cell.is_flagged) or -1
+        self.__refresh_frontier(cell)
 
-        for x, y in self.mines:
-            cell = self.at(x, y)
-            cell.has_mine = True
+    def on_open(self, cell: CellButton) -> None:
+        if cell.is_flagged:
+            return
 
-        for cell in self:
-            for neighbor in self.at(*cell.pos).neighbors:
-                if neighbor.has_mine:
-                    cell.value += 1
+        if not cell.is_opened:
+            pending = [cell]
+        elif self.flags_around(*cell.pos) >= cell.value:
+            pending = list(self.eligible_neighbors(*cell.pos))
+        else:
+            return
+
+        # explicit stack, openings on big boards are too deep to recurse
+        opened: list[CellButton] = []
+        while pending:
+            cell = pending.pop()
+            if cell.is_opened or cell.is_flagged:
+                continue
+
+            if cell.has_mine:
+                cell.explode()
+                self.__changed_columns.add(cell.x)
+                self.exploded = True
+                continue
+
+            self.__open_cell(cell)
+            self.num_opened += 1
+            opened.append(cell)
+            if cell.value == 0:
+                pending.extend(self.eligible_neighbors(*cell.pos))
+
+        self.__refresh_frontier_around(opened)
+
+    def generate_board(
+        self, starts_at: T_COORD, layout: Optional[Layout] = None
+    ) -> None:
+        """
+        places mines avoiding `starts_at`, or those of a layout prepared
+        beforehand for the same spot
+        """
+        if layout is None:
+            layout = Layout.generate(
+                self.__rows, self.__cols, self.num_mines, starts_at
+            )
+        assert layout.rows == self.__rows and layout.cols == self.__cols
+        assert starts_at not in layout.mines, starts_at
+
+        self.layout = layout
+        self.mines = layout.mines
+
+        for x, col in enumerate(self.board):
+            for y, cell in enumerate(col):
+                cell.value = layout.values[x * self.__rows + y]
+
+        for x, y in self.mines:
+            self.at(x, y).has_mine = True
 
         self.generated = True
         self.__started_at = perf_counter()
 
+    def close(self) -> None:
+        """releases what the grid holds beyond its cells, nothing by default"""
+
     def reveal(self) -> None:
+        opened = []
         for cell in self.unopened():
             if cell.has_mine:
-                cell.is_opened = True
+                self.__open_cell(cell)
+                opened.append(cell)
+            elif cell.is_flagged:
+                cell.mark_dirty()  # drawn as a false mine once revealed
+        self.__refresh_frontier_around(opened)
 
         if not self.revealed:
             self.elapsed = perf_counter() - self.__started_at
@@ -0,0 +1,181 @@
+"""
+line oriented protocol for bots playing over stdin/stdout, no window needed
+
+    poetry run ms-bot
+
+every input line holds one or more `;` separated commands, each addressed to
+a game id, and gets exactly one output line with the results in the same
+order, so many games can be driven over a single pipe:
+
+    > a new 16 30 99 42; b new 9 9 10
+    < a ok; b ok
+    > a open 3,4; b open 0,0 8,8
+    < a play 3,4:0 3,5:1 4,4:2; b lost 0,0:1 8,8:*
+    > a flag 5,5 6,6; a chord 4,4
+    < a play 5,5:F 6,6:F; a play 4,3:1
+
+commands: `new <rows> <cols> <mines> [seed]`, `open <x,y>...`,
+`flag <x,y>...` (toggles), `chord <x,y>...` and `close`. Results of moves
+are the game state (`play`, `won` or `lost`) followed by every cell changed
+by the command: its value once opened, `*` for a hit mine, `F` and `U` for
+(un)flagged ones. Failures, boards over 250000 cells included, are reported
+as `<id> error <reason>`.
+"""
+import random
+import sys
+from typing import Callable
+from typing import Optional
+from typing import TextIO
+
+from pygame import Rect
+
+from ms.base import CellButton
+from ms.base import CustomMode
+from ms.base import Grid
+from ms.base import Layout
+from ms.base import T_COORD
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class BotGame:
+    MAX_CELLS = 250_000
+
+    def __init__(
+        self, rows: int, cols: int, num_mines: int, seed: Optional[int]
+    ):
+        if rows <= 0 or cols <= 0 or not 0 <= num_mines < rows * cols:
+            raise ProtocolError("bad board size")
+        if rows * cols > self.MAX_CELLS:
+            raise ProtocolError(f"board larger than {self.MAX_CELLS} cells")
+
+        self.mode = CustomMode(rows, cols, num_mines)
+        self.grid = Grid(Rect(0, 0, cols, rows), self.mode, scale=1)
+        self.grid.dirty.clear()
+        self.rng = random.Random(seed)
+
+    @property
+    def state(self) -> str:
+        if not self.grid.generated or not self.grid.is_finished:
+            return "play"
+        return "lost" if self.grid.exploded else "won"
+
+    def __cell(self, token: str) -> CellButton:
+        try:
+            x, y = (int(part) for part in token.split(","))
+        except ValueError:
+            raise ProtocolError(f"bad coordinate {token}")
+        if not (0 <= x < self.mode.cols and 0 <= y < self.mode.rows):
+            raise ProtocolError(f"out of board {token}")
+        return self.grid.at(x, y)
+
+    def __generate(self, starts_at: T_COORD) -> None:
+        layout = Layout.generate(
+            self.mode.rows,
+            self.mode.cols,
+            self.mode.num_mines,
+            starts_at,
+            rng=self.rng,
+        )
+        self.grid.generate_board(starts_at, layout)
+
+    def open(self, cell: CellButton) -> None:
+        if not self.grid.generated:
+            self.__generate(cell.pos)
+        self.grid.on_open(cell)
+
+    def flag(self, cell: CellButton) -> None:
+        self.grid.toggle_flag(cell)
+
+    def chord(self, cell: CellButton) -> None:
+        if cell.is_opened:
+            self.grid.on_open(cell)
+
+    def play(self, move: Callable[[CellButton], None], args: list[str]) -> str:
+        cells = [self.__cell(token) for token in args]
+        for cell in cells:
+            if self.state != "play":
+                break
+            move(cell)
+
+        # transitions register cells as dirty, which is exactly the delta
+        changes = []
+        for cell in sorted(self.grid.dirty, key=lambda c: c.pos):
+            if cell.has_exploded:
+                mark = "*"
+            elif cell.is_opened:
+                mark = str(cell.value)
+            else:
+                mark = "F" if cell.is_flagged else "U"
+            changes.append(f"{cell.x},{cell.y}:{mark}")
+        self.grid.dirty.clear()
+        return " ".join([self.state, *changes])
+
+
+class BotServer:
+    def __init__(self) -> None:
+        self.games: dict[str, BotGame] = {}
+
+    def __new_game(self, args: list[str]) -> BotGame:
+        try:
+            numbers = [int(arg) for arg in args]
+        except ValueError:
+            raise ProtocolError("bad new arguments")
+        if len(numbers) not in (3, 4):
+            raise ProtocolError("new takes rows cols mines [seed]")
+        rows, cols, num_mines = numbers[:3]
+        seed = numbers[3] if len(numbers) == 4 else None
+        return BotGame(rows, cols, num_mines, seed)
+
+    def handle_command(self, command: str) -> str:
+        parts = command.split()
+        if len(parts) < 2:
+            return f"{command or '-'} error missing command"
+
+        game_id, verb, *args = parts
+        try:
+            if verb == "new":
+                self.games[game_id] = self.__new_game(args)
+                return f"{game_id} ok"
+
+            game = self.games.get(game_id)
+            if game is None:
+                raise ProtocolError("unknown game")
+
+            if verb == "close":
+                del self.games[game_id]
+                return f"{game_id} closed"
+
+            moves = {"open": game.open, "flag": game.flag, "chord": game.chord}
+            if verb not in moves:
+                raise ProtocolError(f"unknown command {verb}")
+            return f"{game_id} {game.play(moves[verb], args)}"
+        except ProtocolError as e:
+            return f"{game_id} error {e}"
+        except Exception as e:  # one broken game must not stop the others
+            return f"{game_id} error internal {type(e).__name__}"
+
+    def handle_line(self, line: str) -> str:
+        return "; ".join(
+            self.handle_command(command.strip())
+            for command in line.split(";")
+            if command.strip()
+        )
+
+    def serve(self, stdin: TextIO, stdout: TextIO) -> None:
+        for line in stdin:
+            if not line.strip():
+                continue
+            stdout.write(self.handle_line(line) + "\n")
+            stdout.flush()
+
+
+def main() -> int:
+    BotServer().serve(sys.stdin, sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,434 @@
+import random
+import shutil
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from tempfile import mkdtemp
+from typing import Any
+from typing import Iterator
+from typing import Optional
+
+from pygame import Rect
+
+from ms.base import BoardSpec
+from ms.base import CellButton
+from ms.base import Grid
+from ms.base import Layout
+from ms.base import T_COORD
+
+T_CHUNK_KEY = tuple[int, int]
+T_CHUNK_STATE = bytearray
+
+# per cell state is packed into a single byte, low nibble keeps the value
+VALUE_MASK = 0x0F
+MINE = 0x10
+OPENED = 0x20
+FLAGGED = 0x40
+EXPLODED = 0x80
+
+NEIGHBOR_OFFSETS = (
+    (-1, 0),
+    (-1, -1),
+    (0, -1),
+    (1, -1),
+    (1, 0),
+    (1, 1),
+    (0, 1),
+    (-1, 1),
+)
+
+
+class ChunkStore:
+    """
+    compact on-disk store for evicted chunks, one zlib blob per chunk
+
+    only chunks touched by the player end up here, untouched ones are cheaper
+    to regenerate from the seed than to read back
+    """
+
+    def __init__(self, root: Optional[Path] = None):
+        self.__owns_root = root is None
+        if root is None:
+            root = Path(mkdtemp(prefix="ms-chunks-"))
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def __path(self, key: T_CHUNK_KEY) -> Path:
+        return self.root / f"{key[0]}_{key[1]}.chunk"
+
+    def save(self, key: T_CHUNK_KEY, state: T_CHUNK_STATE) -> None:
+        self.__path(key).write_bytes(zlib.compress(state))
+
+    def load(self, key: T_CHUNK_KEY) -> Optional[T_CHUNK_STATE]:
+        try:
+            return bytearray(zlib.decompress(self.__path(key).read_bytes()))
+        except FileNotFoundError:
+            return None
+
+    def clear(self) -> None:
+        for path in self.root.glob("*.chunk"):
+            path.unlink()
+
+    def close(self) -> None:
+        """drops stored chunks, and the directory if it was made here"""
+        if self.__owns_root:
+            shutil.rmtree(self.root, ignore_errors=True)
+        else:
+            self.clear()
+
+
+class ChunkedGrid:
+    """
+    endless board split into square chunks, played through `EndlessGrid`
+
+    mines of a chunk are derived from the seed and the chunk coordinate, so
+    the very same layout is produced no matter when (or how many times) the
+    chunk gets generated. At most `max_chunks` chunks are kept in memory,
+    least recently used ones outside the viewport are evicted to `store`.
+
+    Openings grow without bound on sparse boards, so density is kept above
+    `MIN_DENSITY` and a single open stops after `max_fill` cells, leaving
+    the rest of the opening to later clicks.
+    """
+
+    MIN_DENSITY = 0.12
+
+    def __init__(
+        self,
+        seed: int,
+        density: float = 0.16,
+        chunk_size: int = 16,
+        max_chunks: int = 64,
+        store: Optional[ChunkStore] = None,
+        max_fill: int = 10_000,
+    ):
+        assert self.MIN_DENSITY <= density < 1, density
+        assert chunk_size > 0, chunk_size
+        assert max_fill > 0, max_fill
+        self.seed = seed
+        self.density = density
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.max_fill = max_fill
+        self.store = ChunkStore() if store is None else store
+        self.generated = False
+        self.exploded = False
+        self.num_opened = 0
+        self.num_flagged = 0
+        self.__safe: Optional[T_COORD] = None
+        self.__chunks: OrderedDict[T_CHUNK_KEY, T_CHUNK_STATE] = OrderedDict()
+        self.__touched: set[T_CHUNK_KEY] = set()
+        self.__visible: set[T_CHUNK_KEY] = set()
+
+    @property
+    def is_finished(self) -> bool:
+        return self.exploded
+
+    def close(self) -> None:
+        self.__chunks.clear()
+        self.__touched.clear()
+        self.store.close()
+
+    @property
+    def num_loaded(self) -> int:
+        return len(self.__chunks)
+
+    def chunk_key(self, x: int, y: int) -> T_CHUNK_KEY:
+        return x // self.chunk_size, y // self.chunk_size
+
+    def neighbor_coordinates(self, x: int, y: int) -> Iterator[T_COORD]:
+        yield from ((x + dx, y + dy) for dx, dy in NEIGHBOR_OFFSETS)
+
+    def __index(self, x: int, y: int) -> int:
+        return (x % self.chunk_size) * self.chunk_size + y % self.chunk_size
+
+    def __is_safe(self, x: int, y: int) -> bool:
+        if self.__safe is None:
+            return False
+        sx, sy = self.__safe
+        return abs(x - sx) <= 1 and abs(y - sy) <= 1
+
+    def __generate_chunk(self, key: T_CHUNK_KEY) -> T_CHUNK_STATE:
+        cx, cy = key
+        rng = random.Random(f"{self.seed}:{cx}:{cy}")
+        state = bytearray(self.chunk_size * self.chunk_size)
+        for lx in range(self.chunk_size):
+            for ly in range(self.chunk_size):
+                x = cx * self.chunk_size + lx
+                y = cy * self.chunk_size + ly
+                # draw for every cell to keep the sequence stable
+                if rng.random() < self.density and not self.__is_safe(x, y):
+                    state[lx * self.chunk_size + ly] = MINE
+        return state
+
+    def __evict(self, reserve: int = 0) -> None:
+        overflow = len(self.__chunks) + reserve - self.max_chunks
+        if overflow <= 0:
+            return
+
+        # oldest first, visible chunks stay whatever their age is
+        evictable = [k for k in self.__chunks if k not in self.__visible]
+        victims = evictable[:overflow]
+        for key in victims:
+            state = self.__chunks.pop(key)
+            if key in self.__touched:
+                self.store.save(key, state)
+                self.__touched.discard(key)
+
+    def __chunk(self, key: T_CHUNK_KEY) -> T_CHUNK_STATE:
+        state = self.__chunks.get(key)
+        if state is not None:
+            self.__chunks.move_to_end(key)
+            return state
+
+        state = self.store.load(key)
+        if state is None:
+            state = self.__generate_chunk(key)
+        self.__evict(reserve=1)
+        self.__chunks[key] = state
+        return state
+
+    def state(self, x: int, y: int) -> int:
+        return self.__chunk(self.chunk_key(x, y))[self.__index(x, y)]
+
+    def __set_state(self, x: int, y: int, value: int) -> None:
+        key = self.chunk_key(x, y)
+        self.__chunk(key)[self.__index(x, y)] = value
+        self.__touched.add(key)
+
+    def has_mine(self, x: int, y: int) -> bool:
+        return bool(self.state(x, y) & MINE)
+
+    def mines_around(self, x: int, y: int) -> int:
+        return sum(
+            self.has_mine(*pos) for pos in self.neighbor_coordinates(x, y)
+        )
+
+    def flags_around(self, x: int, y: int) -> int:
+        return sum(
+            bool(self.state(*pos) & FLAGGED)
+            for pos in self.neighbor_coordinates(x, y)
+        )
+
+    def set_viewport(self, x: int, y: int, cols: int, rows: int) -> None:
+        """marks chunks under the viewport as visible and loads them"""
+        x_min, y_min = self.chunk_key(x, y)
+        x_max, y_max = self.chunk_key(x + cols - 1, y + rows - 1)
+        self.__visible = {
+            (cx, cy)
+            for cx in range(x_min, x_max + 1)
+            for cy in range(y_min, y_max + 1)
+        }
+        for key in self.__visible:
+            self.__chunk(key)
+        self.__evict()
+
+    def cells(
+        self, x: int, y: int, cols: int, rows: int
+    ) -> Iterator[tuple[int, int, int]]:
+        """(x, y, state) for every cell of the given area"""
+        for cell_x in range(x, x + cols):
+            for cell_y in range(y, y + rows):
+                yield cell_x, cell_y, self.state(cell_x, cell_y)
+
+    def __flagged(self) -> list[T_COORD]:
+        flagged = []
+        for key in self.__touched:
+            state = self.__chunks.get(key) or self.store.load(key) or b""
+            for index, cell in enumerate(state):
+                if cell & FLAGGED:
+                    lx, ly = divmod(index, self.chunk_size)
+                    flagged.append(
+                        (
+                            key[0] * self.chunk_size + lx,
+                            key[1] * self.chunk_size + ly,
+                        )
+                    )
+        return flagged
+
+    def generate_board(self, starts_at: T_COORD) -> None:
+        # only flags can be placed before, chunks built before the safe spot
+        # was known are forgotten and the flags carried over
+        flagged = self.__flagged()
+        self.__safe = starts_at
+        self.__chunks.clear()
+        self.__touched.clear()
+        self.store.clear()
+        for x, y in flagged:
+            self.__set_state(x, y, self.state(x, y) | FLAGGED)
+        self.generated = True
+
+    def toggle_flag(self, x: int, y: int) -> None:
+        state = self.state(x, y)
+        if state & OPENED:
+            return
+
+        self.__set_state(x, y, state ^ FLAGGED)
+        self.num_flagged += 1 if not state & FLAGGED else -1
+
+    def on_open(self, x: int, y: int) -> None:
+        state = self.state(x, y)
+        if state & FLAGGED:
+            return
+
+        if not state & OPENED:
+            pending = [(x, y)]
+        elif self.flags_around(x, y) >= state & VALUE_MASK:
+            pending = list(self.neighbor_coordinates(x, y))
+        else:
+            return
+
+        budget = self.max_fill
+        while pending and budget:
+            pos = pending.pop()
+            state = self.state(*pos)
+            if state & (OPENED | FLAGGED):
+                continue
+
+            if state & MINE:
+                self.__set_state(*pos, state | EXPLODED)
+                self.exploded = True
+                continue
+
+            value = self.mines_around(*pos)
+            self.__set_state(*pos, state | OPENED | value)
+            self.num_opened += 1
+            budget -= 1
+            if value == 0:
+                pending.extend(self.neighbor_coordinates(*pos))
+
+
+class EndlessMode:
+    """viewport size of the endless mode, its board has no edges nor count"""
+
+    __slots__ = ("rows", "cols", "density")
+
+    num_mines = 0
+
+    def __init__(self, rows: int = 16, cols: int = 30, density: float = 0.16):
+        assert rows > 0 and cols > 0, (rows, cols)
+        self.rows = rows
+        self.cols = cols
+        self.density = density
+
+    @property
+    def size(self) -> T_COORD:
+        return self.rows, self.cols
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, EndlessMode) and (
+            other.rows,
+            other.cols,
+            other.density,
+        ) == (self.rows, self.cols, self.density)
+
+    def __hash__(self) -> int:
+        return hash((self.rows, self.cols, self.density))
+
+    def __repr__(self) -> str:
+        return f"EndlessMode({self.rows}, {self.cols}, {self.density})"
+
+
+ENDLESS = EndlessMode()
+
+
+class EndlessGrid(Grid):
+    """
+    grid of cells showing a scrollable viewport of a `ChunkedGrid`
+
+    moves go to the model and the cells copy its state back, so drawing and
+    input work exactly as on a regular board
+    """
+
+    def __init__(self, rect: Rect, mode: EndlessMode, scale: int):
+        self.endless_mode = mode
+        self.origin: T_COORD = 0, 0  # board coordinates of the top left cell
+        self.model = ChunkedGrid(0, density=mode.density)
+        super().__init__(rect, mode, scale)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.model.is_finished
+
+    @property
+    def left_unflagged(self) -> int:
+        # nothing to count down from, placed flags are shown instead
+        return self.num_flagged
+
+    def __to_board(self, cell: CellButton) -> T_COORD:
+        return self.origin[0] + cell.x, self.origin[1] + cell.y
+
+    def close(self) -> None:
+        self.model.close()
+
+    def reset_board(self, mode: Optional[BoardSpec] = None) -> None:
+        super().reset_board(mode)
+        self.model.close()
+        self.model = ChunkedGrid(
+            random.getrandbits(32), density=self.endless_mode.density
+        )
+        self.origin = 0, 0
+        self.scroll(0, 0)
+
+    def scroll(self, dx: int, dy: int) -> None:
+        x, y = self.origin[0] + dx, self.origin[1] + dy
+        self.origin = x, y
+        self.model.set_viewport(
+            x, y, self.endless_mode.cols, self.endless_mode.rows
+        )
+        self.sync()
+
+    def sync(self) -> None:
+        """copies the model state of the viewport into the cells"""
+        shows_mines = self.model.exploded
+        for cell in self:
+            state = self.model.state(*self.__to_board(cell))
+            has_mine = bool(state & MINE)
+            looks = (
+                bool(state & OPENED) or (shows_mines and has_mine),
+                bool(state & FLAGGED),
+                bool(state & EXPLODED),
+                has_mine,
+                state & VALUE_MASK,
+            )
+            if looks != (
+                cell.is_opened,
+                cell.is_flagged,
+                cell.has_exploded,
+                cell.has_mine,
+                cell.value,
+            ):
+                (
+                    cell.is_opened,
+                    cell.is_flagged,
+                    cell.has_exploded,
+                    cell.has_mine,
+                    cell.value,
+                ) = looks
+                cell.mark_dirty()
+
+        self.num_opened = self.model.num_opened
+        self.num_flagged = self.model.num_flagged
+        self.exploded = self.model.exploded
+
+    def generate_board(
+        self, starts_at: T_COORD, layout: Optional[Layout] = None
+    ) -> None:
+        """mines are up to the model, `layout` is ignored"""
+        x, y = self.origin
+        self.model.generate_board((x + starts_at[0], y + starts_at[1]))
+        self.generated = True
+        self.scroll(0, 0)
+
+    def toggle_flag(self, cell: CellButton) -> None:
+        self.model.toggle_flag(*self.__to_board(cell))
+        self.sync()
+
+    def on_open(self, cell: CellButton) -> None:
+        self.model.on_open(*self.__to_board(cell))
+        self.sync()
+
+    def reveal(self) -> None:
+        if not self.revealed:
+            self.sync()
+            self.revealed = True
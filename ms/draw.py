@@ -169,6 +169,7 @@ class AssetArtist:
         self.__screen.blit(text, centered_position)
 
     def draw_score_value(self, rect: Rect, value: int) -> None:
+        value = min(value, 999)  # three digits, custom boards may go beyond
         self.__screen.blit(self.nums_bg, rect)
         self.__screen.blit(
             self.nums_map[value // 100],
@@ -197,6 +198,7 @@ class AssetArtist:
         button.dirty = False
 
     def draw_stats_value(self, rect: Rect, value: str) -> None:
+        pygame.draw.rect(self.__screen, BG_COLOR, rect)
         text = self.stats_font.render(value, True, "black")
         centered_position = (
             rect.left + (rect.w / 2 - text.get_width() / 2),
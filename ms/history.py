@@ -0,0 +1,44 @@
+from ms.base import Grid
+from ms.base import Snapshot
+
+
+class History:
+    """
+    undo/redo timeline of grid snapshots
+
+    snapshots share unchanged board columns, so keeping every single move of
+    a long session is cheap, and jumping anywhere only touches the columns
+    that differ
+    """
+
+    def __init__(self) -> None:
+        self.__snapshots: list[Snapshot] = []
+        self.position = -1
+
+    def __len__(self) -> int:
+        return len(self.__snapshots)
+
+    def clear(self) -> None:
+        self.__snapshots.clear()
+        self.position = -1
+
+    def record(self, grid: Grid) -> bool:
+        """
+        captures the grid after a move, dropping any undone moves, unless the
+        move changed nothing
+        """
+        if not grid.has_changes:
+            return False
+
+        del self.__snapshots[self.position + 1 :]
+        self.__snapshots.append(grid.snapshot())
+        self.position = len(self.__snapshots) - 1
+        return True
+
+    def rewind(self, grid: Grid, position: int) -> bool:
+        if not 0 <= position < len(self.__snapshots):
+            return False
+
+        grid.restore(self.__snapshots[position])
+        self.position = position
+        return True
@@ -1,4 +1,6 @@
 from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
 from time import perf_counter
 from typing import Iterator
 from typing import Optional
@@ -7,13 +9,25 @@ import pygame
 from pygame.sprite import Group
 from pygame.time import Clock
 
+from ms.base import BoardSpec
+from ms.base import CellButton
 from ms.base import Grid
 from ms.base import Mode
 from ms.base import T_COORD
+from ms.chunked import ENDLESS
+from ms.chunked import EndlessGrid
+from ms.chunked import EndlessMode
 from ms.draw import AssetArtist
 from ms.draw import BG_COLOR
 from ms.draw import Button
 from ms.draw import SpriteLib
+from ms.history import History
+from ms.replay import FLAG
+from ms.replay import Move
+from ms.replay import OPEN
+from ms.replay import Recording
+from ms.replay import REWIND
+from ms.speculate import BoardSpeculator
 
 
 @contextmanager
@@ -50,9 +64,17 @@ class Game:
         pygame.MOUSEMOTION,
     ]
     __KEYBOARD_EVENTS = [pygame.QUIT, pygame.KEYUP]
-    __mode: Mode
-
-    def __init__(self, mode: Mode = Mode.EASY) -> None:
+    __SCROLL_KEYS = {  # endless mode only, cells per key press
+        pygame.K_w: (0, -4),
+        pygame.K_a: (-4, 0),
+        pygame.K_s: (0, 4),
+        pygame.K_d: (4, 0),
+    }
+    __mode: BoardSpec
+
+    def __init__(
+        self, mode: BoardSpec = Mode.EASY, speculate: bool = True
+    ) -> None:
         # TODO persistent settings
         self.__screen = pygame.display.set_mode(mode.size)
         pygame.display.set_caption("imps ms")
@@ -74,12 +96,20 @@ class Game:
 
         self.__started_at = perf_counter()
         self.time_displayed = 0
-
-        self.mode = mode
+        self.clicks = 0
+        self.recording: Optional[Recording] = None
+        # moves made before the board exists, the recording needs its mines
+        self.__early_moves: list[Move] = []
+        self.__history = History()
+
+        self.__speculator = BoardSpeculator(enabled=speculate)
+        self.__pressed: set[CellButton] = set()
+        self.__mode = mode
+        self.__apply_mode(mode)
 
         self.__clock = Clock()
 
-    def __configure_layout(self, mode: Mode) -> None:
+    def __configure_layout(self, mode: BoardSpec) -> None:
         self.width = self.size * mode.cols + 2 * self.border
         self.header_h = self.__TOP_MARGIN
         self.grid_w = self.size * mode.cols
@@ -137,16 +167,31 @@ class Game:
             self.__STATS_H,
         )
 
-    def __init_grid(self, mode: Mode) -> None:
-        self.__grid = Grid(self.grid_rect, mode, scale=self.size)
+    def __init_grid(self, mode: BoardSpec) -> None:
+        if isinstance(mode, EndlessMode):
+            self.__grid: Grid = EndlessGrid(
+                self.grid_rect, mode, scale=self.size
+            )
+        else:
+            self.__grid = Grid(self.grid_rect, mode, scale=self.size)
 
     @property
-    def mode(self) -> Mode:
+    def mode(self) -> BoardSpec:
         return self.__mode
 
     @mode.setter
-    def mode(self, mode: Mode) -> None:
+    def mode(self, mode: BoardSpec) -> None:
+        if mode == self.__mode:
+            return
+        self.__grid.close()
         self.__mode = mode
+        self.__apply_mode(mode)
+
+    @property
+    def is_endless(self) -> bool:
+        return isinstance(self.__mode, EndlessMode)
+
+    def __apply_mode(self, mode: BoardSpec) -> None:
         self.__configure_layout(mode)
         new_size = self.width, self.height + self.__STATS_H
         if pygame.display.get_window_size() != new_size:
@@ -155,12 +200,21 @@ class Game:
         self.__grid.mode = mode
         self.__screen.fill(BG_COLOR)
 
-    def start_new(self, mode: Optional[Mode] = None) -> None:
+    def start_new(self, mode: Optional[BoardSpec] = None) -> None:
+        # another mode builds a new grid, its cells are fresh already
+        rebuilt = mode is not None and mode != self.mode
         if mode is not None:
             self.mode = mode
         self.is_over = False
         self.time_displayed = 0
-        self.__grid.reset_board(mode)
+        self.clicks = 0
+        self.recording = None
+        self.__early_moves.clear()
+        self.__history.clear()
+        self.__speculator.clear()
+        self.__pressed.clear()
+        if not rebuilt:
+            self.__grid.reset_board()
 
         self.__artist.draw_border(self.header_rect)
         self.__artist.draw_score_value(
@@ -181,21 +235,87 @@ class Game:
             self.start_new(Mode.MEDIUM)
         elif key == pygame.K_3:
             self.start_new(Mode.HARD)
+        elif key == pygame.K_4:
+            self.start_new(ENDLESS)
+        elif key in self.__SCROLL_KEYS:
+            self.__scroll(*self.__SCROLL_KEYS[key])
+        elif key == pygame.K_F5:
+            self.save_recording()
+        elif key in (pygame.K_z, pygame.K_LEFT):
+            self.__travel(-1)
+        elif key in (pygame.K_y, pygame.K_RIGHT):
+            self.__travel(1)
+
+    def __scroll(self, dx: int, dy: int) -> None:
+        if isinstance(self.__grid, EndlessGrid):
+            for button in self.__pressed:
+                button.press(False)
+            self.__pressed.clear()
+            self.__grid.scroll(dx, dy)
+
+    def __travel(self, step: int) -> None:
+        """moves along the undo/redo timeline"""
+        if not self.__grid.generated:
+            return
+
+        position = self.__history.position + step
+        if not self.__history.rewind(self.__grid, position):
+            return
+
+        self.__record(REWIND, position=position)
+        if self.is_over:  # false mines turn back into flags
+            self.__grid.dirty.update(self.__grid)
+        self.is_over = self.__grid.is_finished
+        self.running = True
+        self.__artist.draw_score_value(
+            self.rect_unflagged, self.__grid.left_unflagged
+        )
+        self.__draw_efficiency()
+
+    def save_recording(self) -> Optional[Path]:
+        if self.recording is None:
+            return None
+
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = Path.cwd() / f"ms-replay-{stamp}.json"
+        self.recording.save(path)
+        return path
+
+    def __record(
+        self, action: str, x: int = 0, y: int = 0, position: int = 0
+    ) -> None:
+        if self.is_endless:  # mines of an endless board are not known
+            return
+        if self.recording is None:
+            self.__early_moves.append(Move(0.0, action, x, y, position))
+        else:
+            at = perf_counter() - self.__started_at
+            self.recording.record(Move(at, action, x, y, position))
 
     def __update_mouse_over(self, pos: T_COORD) -> None:
         hovered = self.__grid.get_cell_under(pos)
 
-        for button in self.__grid:
-            button.dirty = True
-            if not hovered:  # out of grid bounds
-                button.is_pressed = False
-            elif self.left and not hovered.is_opened:  # highlight just one
-                button.is_pressed = button is hovered and not button.is_flagged
-            elif self.left and hovered.is_opened:
-                eligible = self.__grid.eligible_neighbors(*hovered.pos)
-                button.is_pressed = button in eligible  # highlight possible
-            else:
-                button.is_pressed = False  # release otherwise
+        if hovered and not self.__grid.generated and not self.is_endless:
+            self.__speculator.speculate(self.mode)
+
+        pressed: set[CellButton] = set()
+        if not hovered:  # out of grid bounds
+            pass
+        elif self.left and not hovered.is_opened:  # highlight just one
+            if not hovered.is_flagged:
+                pressed.add(hovered)
+        elif self.left and hovered.is_opened:  # highlight possible
+            pressed.update(self.__grid.eligible_neighbors(*hovered.pos))
+
+        for button in self.__pressed - pressed:
+            button.press(False)  # release otherwise
+        for button in pressed:
+            button.press()
+        self.__pressed = pressed
+
+    def click(self, pos: T_COORD) -> None:
+        """left click at a screen position, without going through events"""
+        self.__on_l_mouse_up(pos)
 
     def __on_l_mouse_up(self, pos: T_COORD) -> None:
         if self.new_button.rect.collidepoint(*pos):
@@ -206,13 +326,27 @@ class Game:
 
         if released is not None:
             if not self.__grid.generated:
-                self.__grid.generate_board(released.pos)
+                # falls back to generating in place if nothing was speculated
+                layout = self.__speculator.take(self.mode, released.pos)
+                self.__grid.generate_board(released.pos, layout)
+                self.__speculator.clear()
                 self.__grid.generated = True
                 self.running = True
                 self.__started_at = perf_counter()
+                if not self.is_endless:
+                    self.recording = Recording(
+                        self.mode.rows,
+                        self.mode.cols,
+                        self.__grid.mines,
+                        list(self.__early_moves),
+                    )
             if not self.is_over:
+                self.clicks += 1
+                self.__record(OPEN, *released.pos)
                 self.__grid.on_open(released)
+                self.__history.record(self.__grid)
                 self.__update_mouse_over(pos)
+                self.__draw_efficiency()
 
     def __on_r_mouse_down(self, pos: T_COORD) -> None:
         cell = self.__grid.get_cell_under(pos)
@@ -220,15 +354,31 @@ class Game:
         if cell is None or cell.is_opened:
             return
 
-        cell.is_flagged = not cell.is_flagged
-        self.__grid.num_flagged += int(cell.is_flagged) or -1
+        self.clicks += 1
+        self.__record(FLAG, *cell.pos)
+        self.__grid.toggle_flag(cell)
+        self.__history.record(self.__grid)
         self.__artist.draw_score_value(
             self.rect_unflagged, self.__grid.left_unflagged
         )
+        self.__draw_efficiency()
 
     def __handle_mouse(self) -> None:
-        for event in pygame.event.get(self.__MOUSE_EVENTS):
-            self.left, self.middle, self.right = pygame.mouse.get_pressed()
+        events = pygame.event.get(self.__MOUSE_EVENTS)
+        # sampled once the queue is pumped, so it matches the events above
+        self.left, self.middle, self.right = pygame.mouse.get_pressed()
+        # only the latest pointer position matters, so a run of motion events
+        # is collapsed and applied right before the next button transition
+        motion: Optional[T_COORD] = None
+
+        for event in events:
+            if event.type == pygame.MOUSEMOTION:
+                motion = event.pos
+                continue
+
+            if motion is not None:
+                self.__on_mouse_motion(motion)
+                motion = None
 
             if event.type == pygame.MOUSEBUTTONUP:
                 self.__handle_new_game_button(event.pos)
@@ -250,10 +400,13 @@ class Game:
                 if not self.is_over and not self.left and self.right:
                     self.__on_r_mouse_down(event.pos)
 
-            if event.type == pygame.MOUSEMOTION:
-                self.__handle_new_game_button(event.pos)
-                if not self.is_over:
-                    self.__update_mouse_over(event.pos)
+        if motion is not None:
+            self.__on_mouse_motion(motion)
+
+    def __on_mouse_motion(self, pos: T_COORD) -> None:
+        self.__handle_new_game_button(pos)
+        if not self.is_over:
+            self.__update_mouse_over(pos)
 
     def __handle_new_game_button(self, mouse_pos: T_COORD) -> None:
         hovers = self.new_button.rect.collidepoint(mouse_pos)
@@ -267,6 +420,26 @@ class Game:
             self.__artist.draw_score_value(
                 self.rect_elapsed, self.time_displayed
             )
+            self.__draw_efficiency()
+
+    def __draw_efficiency(self) -> None:
+        if not self.running:
+            return
+
+        elapsed = perf_counter() - self.__started_at
+        if self.is_endless:
+            opened = self.__grid.num_opened
+            self.__artist.draw_stats_value(
+                self.rect_stats, f"{opened} opened {opened / elapsed:.1f}/s"
+            )
+            return
+
+        solved, total = self.__grid.bbbv_solved, self.__grid.bbbv
+        self.__artist.draw_stats_value(
+            self.rect_stats,
+            f"3BV {solved}/{total} {solved / elapsed:.2f}/s "
+            f"{self.clicks / max(solved, 1):.2f}cl",
+        )
 
     @staticmethod
     def setup_events() -> None:
@@ -289,18 +462,25 @@ class Game:
         if not self.is_over:
             return
 
-        if self.running and not any([b.has_exploded for b in self.__grid]):
+        if self.running and not self.__grid.exploded:
             completed_at = perf_counter() - self.__started_at
             self.__artist.draw_stats_value(
-                self.rect_stats, f"Completed in {completed_at:.03f}"
+                self.rect_stats,
+                f"{completed_at:.03f}s  3BV {self.__grid.bbbv}  "
+                f"{self.__grid.bbbv / completed_at:.2f}/s",
             )
 
         self.__grid.reveal()
         self.running = False
 
     def __update_grid(self) -> None:
-        for cell in self.__grid:
+        for cell in self.__grid.dirty:
             cell.draw(self.is_over)
+        self.__grid.dirty.clear()
+
+    def close(self) -> None:
+        self.__speculator.shutdown()
+        self.__grid.close()
 
     def event_loop(self) -> None:
         self.__handle_keyboard()
@@ -327,6 +507,8 @@ def main() -> int:
         while not game.quit_invoked:
             game.event_loop()
 
+        game.close()
+
     return 0
 
 
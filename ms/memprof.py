@@ -0,0 +1,189 @@
+"""
+memory profiling mode: traces allocations around the board lifecycle
+
+    poetry run ms-memprof --mode hard
+    poetry run ms-memprof --rows 200 --cols 300 --mines 12000 --top 10
+"""
+import argparse
+import gc
+import os
+import tracemalloc
+from contextlib import contextmanager
+from typing import Iterator
+
+import pygame
+from pygame import Rect
+
+from ms.base import BoardSpec
+from ms.base import CustomMode
+from ms.base import Grid
+from ms.base import Mode
+from ms.main import Game
+from ms.main import pygame_runner
+
+MODES = {"easy": Mode.EASY, "medium": Mode.MEDIUM, "hard": Mode.HARD}
+IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class PhaseReport:
+    def __init__(
+        self,
+        name: str,
+        peak: int,
+        retained: int,
+        count: int,
+        unit: str,
+        top: list[tracemalloc.StatisticDiff],
+    ):
+        self.name = name
+        self.peak = peak
+        self.retained = retained
+        self.count = count  # of units the retained memory is spread over
+        self.unit = unit
+        self.top = top
+
+    def __str__(self) -> str:
+        lines = [
+            f"== {self.name}",
+            f"   peak      {self.peak / 1024:12.1f} KiB",
+            f"   retained  {self.retained / 1024:12.1f} KiB",
+            f"   per {self.unit:<6}{self.retained / self.count:12.1f} B",
+        ]
+        for stat in self.top:
+            frame = stat.traceback[0]
+            lines.append(
+                f"   {stat.size_diff / 1024:+10.1f} KiB "
+                f"{stat.count_diff:+8d} blocks  "
+                f"{frame.filename}:{frame.lineno}"
+            )
+        return "\n".join(lines)
+
+
+class MemoryProfiler:
+    """collects a `PhaseReport` per traced block"""
+
+    def __init__(self, num_cells: int, top: int = 5):
+        self.num_cells = num_cells
+        self.top = top
+        self.reports: list[PhaseReport] = []
+
+    @contextmanager
+    def phase(
+        self, name: str, count: int = 0, unit: str = "cell"
+    ) -> Iterator[None]:
+        """traces the block, reporting retained memory per cell by default"""
+        # cells reference each other, leftovers of a previous phase are
+        # only freed by the cycle collector
+        gc.collect()
+        before = tracemalloc.take_snapshot().filter_traces(IGNORED)
+        current_before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+
+        yield
+
+        gc.collect()
+        current_after, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot().filter_traces(IGNORED)
+        self.reports.append(
+            PhaseReport(
+                name,
+                peak=peak - current_before,
+                retained=current_after - current_before,
+                count=count or self.num_cells,
+                unit=unit,
+                top=after.compare_to(before, "lineno")[: self.top],
+            )
+        )
+
+
+def profile_grid(profiler: MemoryProfiler, mode: BoardSpec) -> None:
+    rect = Rect(0, 0, mode.cols, mode.rows)
+    center = mode.cols // 2, mode.rows // 2
+
+    with profiler.phase("Grid.reset_board (build)"):
+        grid = Grid(rect, mode, scale=1)
+
+    with profiler.phase("Grid.reset_board (reuse)"):
+        grid.reset_board()
+
+    with profiler.phase("Grid.generate_board"):
+        grid.generate_board(center)
+
+    with profiler.phase("Grid.on_open (every safe cell)"):
+        for cell in grid:
+            if not cell.has_mine:
+                grid.on_open(cell)
+
+
+def profile_event_loop(
+    profiler: MemoryProfiler, mode: BoardSpec, frames: int
+) -> None:
+    # layouts speculated in the background would dominate the report
+    game = Game(mode, speculate=False)
+    game.setup_events()
+    game.start_new()
+    area = game.grid_rect
+
+    # a game in progress, so timer, game over checks and hovering all run
+    game.click(area.center)
+    game.event_loop()
+
+    name = f"Game.event_loop ({frames} frames)"
+    with profiler.phase(name, count=frames, unit="frame"):
+        for frame in range(frames):
+            for step in range(10):  # a fast swipe over the grid
+                pos = (
+                    area.left + (frame * 10 + step) * 7 % area.w,
+                    area.top + (frame * 10 + step) * 3 % area.h,
+                )
+                pygame.event.post(
+                    pygame.event.Event(
+                        pygame.MOUSEMOTION, pos=pos, rel=(0, 0), buttons=(0,)
+                    )
+                )
+            game.event_loop()
+
+    game.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="ms-memprof")
+    parser.add_argument("--mode", choices=MODES, default="hard")
+    parser.add_argument("--rows", type=int)
+    parser.add_argument("--cols", type=int)
+    parser.add_argument("--mines", type=int)
+    parser.add_argument("--frames", type=int, default=150)
+    parser.add_argument("--top", type=int, default=5)
+    args = parser.parse_args()
+
+    mode: BoardSpec = MODES[args.mode]
+    if args.rows or args.cols or args.mines:
+        mode = CustomMode(
+            args.rows or mode.rows,
+            args.cols or mode.cols,
+            mode.num_mines if args.mines is None else args.mines,
+        )
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+    profiler = MemoryProfiler(mode.rows * mode.cols, top=args.top)
+    tracemalloc.start()
+    with pygame_runner():
+        profile_grid(profiler, mode)
+        if args.frames:
+            profile_event_loop(profiler, mode, args.frames)
+    tracemalloc.stop()
+
+    print(f"{mode}: {mode.rows}x{mode.cols}, {mode.num_mines} mines")
+    for report in profiler.reports:
+        print(report)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
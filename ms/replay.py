@@ -0,0 +1,267 @@
+"""
+recorded games and their headless rendering into PNG frames
+
+    poetry run ms-replay ms-replay-20240101-120000.json frames/ --fps 30
+"""
+import argparse
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+from typing import Optional
+
+import pygame
+from pygame import Rect
+
+from ms.base import CustomMode
+from ms.base import Grid
+from ms.base import Layout
+from ms.base import T_COORD
+from ms.draw import AssetArtist
+from ms.draw import BG_COLOR
+from ms.draw import SpriteLib
+from ms.history import History
+
+OPEN = "open"
+FLAG = "flag"
+REWIND = "rewind"
+
+
+class Move:
+    __slots__ = ("at", "action", "x", "y", "position")
+
+    def __init__(
+        self, at: float, action: str, x: int = 0, y: int = 0, position: int = 0
+    ):
+        assert action in (OPEN, FLAG, REWIND), action
+        self.at = at  # seconds since the first click, flags before it at 0
+        self.action = action
+        self.x = x
+        self.y = y
+        self.position = position  # of the timeline, where a rewind moves to
+
+    @property
+    def pos(self) -> T_COORD:
+        return self.x, self.y
+
+    def to_json(self) -> list[Any]:
+        if self.action == REWIND:
+            return [self.at, self.action, self.position]
+        return [self.at, self.action, self.x, self.y]
+
+    @classmethod
+    def from_json(cls, data: list[Any]) -> "Move":
+        at, action, *args = data
+        if action == REWIND:
+            return cls(at, action, position=args[0])
+        return cls(at, action, *args)
+
+
+class Recording:
+    """board layout plus every move made on it, enough to replay a game"""
+
+    def __init__(
+        self,
+        rows: int,
+        cols: int,
+        mines: list[T_COORD],
+        moves: Optional[list[Move]] = None,
+    ):
+        self.rows = rows
+        self.cols = cols
+        self.mines = mines
+        self.moves: list[Move] = [] if moves is None else moves
+
+    @property
+    def duration(self) -> float:
+        return self.moves[-1].at if self.moves else 0.0
+
+    def record(self, move: Move) -> None:
+        self.moves.append(move)
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "cols": self.cols,
+            "mines": self.mines,
+            "moves": [move.to_json() for move in self.moves],
+        }
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> "Recording":
+        return cls(
+            data["rows"],
+            data["cols"],
+            [(x, y) for x, y in data["mines"]],
+            [Move.from_json(move) for move in data["moves"]],
+        )
+
+    def save(self, path: Path) -> None:
+        path.write_text(json.dumps(self.to_json()))
+
+    @classmethod
+    def load(cls, path: Path) -> "Recording":
+        return cls.from_json(json.loads(path.read_text()))
+
+
+class ReplayRenderer:
+    """
+    replays a recording on a grid drawn into the (headless) display surface
+
+    expects the display to be set up already, see `render_frames`
+    """
+
+    __TAIL = 1.0  # seconds to keep showing the final board
+
+    def __init__(self, recording: Recording, size: int):
+        self.recording = recording
+        self.size = size
+        self.border = size // 5
+        self.header_h = 2 * size
+        self.width = size * recording.cols + 2 * self.border
+        self.height = self.header_h + size * recording.rows + 2 * self.border
+
+        displays_w = int(2.75 * size)
+        displays_h = self.header_h - 2 * self.border
+        self.rect_unflagged = Rect(
+            2 * self.border, self.border, displays_w, displays_h
+        )
+        self.rect_elapsed = Rect(
+            self.width - displays_w - 2 * self.border,
+            self.border,
+            displays_w,
+            displays_h,
+        )
+        self.grid_container_rect = Rect(
+            0, self.header_h, self.width, self.height - self.header_h
+        )
+        grid_rect = Rect(
+            self.border,
+            self.header_h + self.border,
+            size * recording.cols,
+            size * recording.rows,
+        )
+
+        mode = CustomMode(recording.rows, recording.cols, len(recording.mines))
+        self.grid = Grid(grid_rect, mode, scale=size)
+        self.history = History()
+        self.__next_move = 0
+
+    @classmethod
+    def num_frames(cls, recording: Recording, fps: int) -> int:
+        return math.ceil((recording.duration + cls.__TAIL) * fps) + 1
+
+    def __apply(self, move: Move) -> None:
+        # flags may come first, the board is generated by the first open
+        if move.action == OPEN and not self.grid.generated:
+            layout = Layout(
+                self.recording.rows, self.recording.cols, self.recording.mines
+            )
+            self.grid.generate_board(move.pos, layout)
+
+        if move.action == REWIND:
+            was_over = self.grid.is_finished
+            self.history.rewind(self.grid, move.position)
+            if was_over:  # false mines turn back into flags
+                self.grid.dirty.update(self.grid)
+        else:
+            cell = self.grid.at(*move.pos)
+            if move.action == OPEN:
+                self.grid.on_open(cell)
+            else:
+                self.grid.toggle_flag(cell)
+            self.history.record(self.grid)
+
+        if self.grid.generated and self.grid.is_finished:
+            self.grid.reveal()
+
+    def advance(self, until: float) -> None:
+        """applies all moves made up to `until` seconds"""
+        moves = self.recording.moves
+        while (
+            self.__next_move < len(moves)
+            and moves[self.__next_move].at <= until
+        ):
+            self.__apply(moves[self.__next_move])
+            self.__next_move += 1
+
+    def draw(self, artist: AssetArtist, elapsed: float, full: bool) -> None:
+        if full:
+            pygame.display.get_surface().fill(BG_COLOR)
+            artist.draw_border(self.grid_container_rect)
+            self.grid.dirty.update(self.grid)
+
+        artist.draw_score_value(self.rect_unflagged, self.grid.left_unflagged)
+        artist.draw_score_value(self.rect_elapsed, min(int(elapsed), 999))
+
+        is_over = self.grid.generated and self.grid.is_finished
+        for cell in self.grid.dirty:
+            cell.draw(is_over)
+        self.grid.dirty.clear()
+
+
+def render_frames(
+    path: Path, out_dir: Path, first: int, last: int, fps: int, size: int
+) -> int:
+    """renders frames `first`..`last` (exclusive) of a recording to PNGs"""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    recording = Recording.load(path)
+    renderer = ReplayRenderer(recording, size)
+
+    pygame.init()
+    pygame.display.set_mode((renderer.width, renderer.height))
+    SpriteLib.setup_sprites(side=size)
+    artist = AssetArtist(size, renderer.border)
+    artist.derive_nums_size(renderer.rect_unflagged)
+    screen = pygame.display.get_surface()
+
+    # fast-forward without drawing, the first frame redraws everything
+    renderer.advance(first / fps)
+    for frame in range(first, last):
+        renderer.advance(frame / fps)
+        renderer.draw(artist, frame / fps, full=frame == first)
+        pygame.image.save(screen, out_dir / f"frame_{frame:06d}.png")
+
+    pygame.quit()
+    return last - first
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="ms-replay")
+    parser.add_argument("recording", type=Path)
+    parser.add_argument("out_dir", type=Path)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--size", type=int, default=24)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    args.out_dir.mkdir(parents=True, exist_ok=True)
+    total = ReplayRenderer.num_frames(Recording.load(args.recording), args.fps)
+
+    # a few ranges per worker keep them busy until the very end
+    num_ranges = min(total, 4 * args.workers)
+    bounds = [total * i // num_ranges for i in range(num_ranges + 1)]
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [
+            executor.submit(
+                render_frames,
+                args.recording,
+                args.out_dir,
+                first,
+                last,
+                args.fps,
+                args.size,
+            )
+            for first, last in zip(bounds, bounds[1:])
+        ]
+        rendered = sum(future.result() for future in futures)
+
+    print(f"{rendered} frames written to {args.out_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,54 @@
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from ms.base import BoardSpec
+from ms.base import Layout
+from ms.base import T_COORD
+
+
+class BoardSpeculator:
+    """
+    prepares a layout in a background worker while the first click is yet to
+    come
+
+    a single layout per board serves any first click, a mine under the
+    clicked cell is moved away, so hovering never queues more work and the
+    click only ever waits for the one job already running
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.__executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="ms-speculate"
+        )
+        self.__mode: Optional[BoardSpec] = None
+        self.__future: Optional[Future[Layout]] = None
+
+    def speculate(self, mode: BoardSpec) -> None:
+        if not self.enabled or (self.__future and mode == self.__mode):
+            return
+
+        self.clear()
+        self.__mode = mode
+        self.__future = self.__executor.submit(
+            Layout.generate, mode.rows, mode.cols, mode.num_mines, None
+        )
+
+    def take(self, mode: BoardSpec, avoid: T_COORD) -> Optional[Layout]:
+        """layout keeping `avoid` free, waits for it if still in the works"""
+        if self.__future is None or mode != self.__mode:
+            self.clear()
+            return None
+
+        future, self.__future = self.__future, None
+        return future.result().clear_of(avoid)
+
+    def clear(self) -> None:
+        if self.__future is not None:
+            self.__future.cancel()
+        self.__future = None
+
+    def shutdown(self) -> None:
+        self.clear()
+        self.__executor.shutdown(wait=False, cancel_futures=True)